@@ -1,15 +1,56 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
-from datetime import datetime, date, timedelta
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Callable, Iterable, List, Optional, Dict, Tuple
+from datetime import datetime, date, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import chain
+import asyncio
+import bisect
+import heapq
+import orjson
 import os
+import threading
+import time
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from enum import Enum
 
 TODOIST_API_TOKEN = os.environ.get("TODOIST_API_TOKEN")
 TODOIST_BASE_URL = "https://api.todoist.com/rest/v2"
+TODOIST_SYNC_URL = "https://api.todoist.com/sync/v9/sync"
+SYNC_BATCH_SIZE = 100  # Sync API 单次请求最多 100 条命令
+# 项目 / 标签 / section 映射的缓存时长（秒），可通过环境变量调整；设为 0 则每次请求都重新拉取
+TODOIST_CACHE_TTL = float(os.environ.get("TODOIST_CACHE_TTL", "60"))
+MAX_CONCURRENT_IMPORTS = 5  # 同时在途的 Todoist 写请求上限，避免触发限流
+HTTP_POOL_SIZE = 20  # 共享 Session 的连接池大小，也是并发读请求的上限，超出的连接用完即丢、得重新握手
 
-app = FastAPI(title="Todoist Schedule Importer v3")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：
+    - 启动时检查 TODOIST_API_TOKEN，缺失就直接启动失败，不用每个请求再检查
+    - 启动时把默认线程池调到和连接池一样大：所有 Todoist 请求都经 asyncio.to_thread 跑在这里，
+      默认的 min(32, CPU 数 + 4) 在小机器上会让并发拉取排队
+    - 关闭时释放共享 Session 的连接池
+    """
+    if not TODOIST_API_TOKEN:
+        raise RuntimeError("TODOIST_API_TOKEN environment variable is not set.")
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="todoist")
+    )
+    yield
+    _session.close()
+
+
+# 响应不需要 ORJSONResponse：各接口都声明了 response_model，FastAPI 会直接用 Pydantic 序列化成 JSON bytes；
+# 和 Todoist 之间的请求体 / 响应体统一用 orjson 编解码
+app = FastAPI(title="Todoist Schedule Importer v3", lifespan=lifespan)
 
 
 # ---------- 数据模型 ----------
@@ -18,6 +59,8 @@ class ScheduleItem(BaseModel):
     """
     单条课 / 时间块 -> 一条 Todoist 任务
     """
+    model_config = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
     title: str = Field(..., description="任务标题或课程名，例如 'A2-1 Further Math'")
     description: Optional[str] = Field(
         default=None,
@@ -77,6 +120,8 @@ class ImportOptions(BaseModel):
     """
     控制导入行为的全局选项
     """
+    model_config = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
     mode: ImportMode = Field(
         default=ImportMode.CREATE,
         description="导入模式：create=只追加任务；replace_project=清空某项目后再创建"
@@ -134,6 +179,8 @@ class ImportRequest(BaseModel):
 
 
 class CreatedTask(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
     index: int
     task_id: str
     content: str
@@ -142,11 +189,15 @@ class CreatedTask(BaseModel):
 
 
 class ErrorInfo(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
     index: int
     message: str
 
 
 class ImportResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
     created: List[CreatedTask]
     errors: List[ErrorInfo]
 
@@ -271,47 +322,145 @@ class FreeSlotResponse(BaseModel):
 
 # ---------- Todoist 帮助函数 ----------
 
-def todoist_headers() -> Dict[str, str]:
+# Todoist 请求头只在启动时构造一次，挂在共享 Session 上
+_AUTH_HEADER: Dict[str, str] = {
+    "Authorization": f"Bearer {TODOIST_API_TOKEN}",
+    "Content-Type": "application/json",
+}
+
+# 所有 Todoist 请求共用一个 Session，复用 keep-alive 连接，避免每次调用都重新握手
+_session = requests.Session()
+_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504],
+        ),
+    ),
+)
+_session.headers.update(_AUTH_HEADER)
+
+
+def get_session() -> requests.Session:
     """
-    构造 Todoist 请求头
+    返回共享的 Todoist Session（已带鉴权请求头）
     """
-    if not TODOIST_API_TOKEN:
-        raise HTTPException(
-            status_code=500,
-            detail="TODOIST_API_TOKEN environment variable is not set."
-        )
-    return {
-        "Authorization": f"Bearer {TODOIST_API_TOKEN}",
-        "Content-Type": "application/json",
-    }
+    return _session
+
+
+def decode_json(resp: requests.Response) -> Any:
+    """
+    用 orjson 解析响应体；解析失败时转成 requests 的 JSONDecodeError（它属于 RequestException），
+    调用方现有的 except requests.RequestException 照样能接住
+    """
+    try:
+        return orjson.loads(resp.content)
+    except orjson.JSONDecodeError as e:
+        raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos, response=resp) from e
+
+
+@dataclass
+class _TodoistCache:
+    """
+    进程内的 {名称: id} 映射缓存（项目 / 标签 / 各项目的 section），按 key 存 (拉取时间, 映射)，
+    TTL 内的请求直接复用，不再重复拉取
+    """
+    entries: Dict[str, Tuple[float, Dict[str, str]]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_todoist_cache = _TodoistCache()
+
+
+def invalidate_todoist_cache():
+    """
+    丢弃缓存的项目 / 标签 / section 映射，下次使用时重新拉取
+    """
+    with _todoist_cache.lock:
+        _todoist_cache.entries.clear()
+
+
+def _cached_fetch(key: str, fetch: Callable[[], Dict[str, str]]) -> Dict[str, str]:
+    """
+    TTL 内返回缓存映射的副本，过期或没有缓存时调用 fetch 重新拉取
+    返回的总是副本：调用方可以随意修改，不会和并发请求互相影响；新建的对象通过 _remember 写回缓存
+    """
+    with _todoist_cache.lock:
+        hit = _todoist_cache.entries.get(key)
+        if hit is not None and time.monotonic() - hit[0] < TODOIST_CACHE_TTL:
+            return dict(hit[1])
+
+    mapping = fetch()
+    with _todoist_cache.lock:
+        _todoist_cache.entries[key] = (time.monotonic(), dict(mapping))
+    return mapping
+
+
+def _remember(key: str, name: str, object_id: str):
+    """
+    把新建对象的 id 写回对应的缓存映射（没有缓存时不用写，下次拉取自然会带上）
+    """
+    with _todoist_cache.lock:
+        hit = _todoist_cache.entries.get(key)
+        if hit is not None:
+            hit[1][name] = object_id
 
 
 def fetch_projects() -> Dict[str, str]:
     """
-    拉取所有项目，返回 {项目名: id}
+    拉取所有项目，返回 {项目名: id}（经 _cached_fetch 缓存）
     """
-    resp = requests.get(
-        f"{TODOIST_BASE_URL}/projects",
-        headers=todoist_headers(),
-        timeout=15,
-    )
-    resp.raise_for_status()
-    projects = resp.json()
-    return {p["name"]: p["id"] for p in projects}
+    def fetch():
+        resp = get_session().get(
+            f"{TODOIST_BASE_URL}/projects",
+            timeout=15,
+        )
+        resp.raise_for_status()
+        return {p["name"]: p["id"] for p in decode_json(resp)}
+
+    return _cached_fetch("projects", fetch)
 
 
 def fetch_labels() -> Dict[str, str]:
     """
-    拉取所有标签，返回 {标签名: id}
+    拉取所有标签，返回 {标签名: id}（经 _cached_fetch 缓存）
     """
-    resp = requests.get(
-        f"{TODOIST_BASE_URL}/labels",
-        headers=todoist_headers(),
-        timeout=15,
-    )
-    resp.raise_for_status()
-    labels = resp.json()
-    return {l["name"]: l["id"] for l in labels}
+    def fetch():
+        resp = get_session().get(
+            f"{TODOIST_BASE_URL}/labels",
+            timeout=15,
+        )
+        resp.raise_for_status()
+        return {l["name"]: l["id"] for l in decode_json(resp)}
+
+    return _cached_fetch("labels", fetch)
+
+
+def section_cache_key(project_id: str) -> str:
+    """
+    某个项目的 section 映射在 _todoist_cache 里的 key
+    """
+    return f"sections/{project_id}"
+
+
+def fetch_sections(project_id: str) -> Dict[str, str]:
+    """
+    拉取某个项目下的所有 sections，返回 {section名: id}（经 _cached_fetch 缓存）
+    """
+    def fetch():
+        resp = get_session().get(
+            f"{TODOIST_BASE_URL}/sections",
+            params={"project_id": project_id},
+            timeout=15,
+        )
+        resp.raise_for_status()
+        return {s["name"]: s["id"] for s in decode_json(resp)}
+
+    return _cached_fetch(section_cache_key(project_id), fetch)
 
 
 def get_or_create_project(name: str, project_map: Dict[str, str]) -> str:
@@ -321,101 +470,154 @@ def get_or_create_project(name: str, project_map: Dict[str, str]) -> str:
     if name in project_map:
         return project_map[name]
 
-    resp = requests.post(
+    resp = get_session().post(
         f"{TODOIST_BASE_URL}/projects",
-        headers=todoist_headers(),
-        json={"name": name},
+        data=orjson.dumps({"name": name}),
         timeout=15,
     )
+    if resp.status_code == 404:
+        invalidate_todoist_cache()
     resp.raise_for_status()
-    project = resp.json()
+    project = decode_json(resp)
     project_map[project["name"]] = project["id"]
+    _remember("projects", project["name"], project["id"])
     return project["id"]
 
 
-def get_or_create_label(name: str, label_map: Dict[str, str]) -> str:
+def sync_commands(commands: List[dict]) -> dict:
     """
-    获取标签 ID；如果没有就创建
+    调用 Todoist Sync API 一次提交一批命令，返回包含 sync_status / temp_id_mapping 的结果
+    响应结构不对时（合法 JSON 但不是预期的对象）同样抛 RequestException 的子类，按请求失败处理
     """
-    if name in label_map:
-        return label_map[name]
-
-    resp = requests.post(
-        f"{TODOIST_BASE_URL}/labels",
-        headers=todoist_headers(),
-        json={"name": name},
-        timeout=15,
+    resp = get_session().post(
+        TODOIST_SYNC_URL,
+        data=orjson.dumps({"commands": commands}),
+        timeout=30,
     )
     resp.raise_for_status()
-    label = resp.json()
-    label_map[label["name"]] = label["id"]
-    return label["id"]
+    result = decode_json(resp)
+    if not (
+        isinstance(result, dict)
+        and isinstance(result.get("sync_status", {}), dict)
+        and isinstance(result.get("temp_id_mapping", {}), dict)
+    ):
+        raise requests.exceptions.InvalidJSONError(
+            f"Unexpected Sync API response: {str(result)[:200]}", response=resp
+        )
+    return result
 
 
-def fetch_sections(project_id: str) -> Dict[str, str]:
+def sync_error_message(status) -> str:
     """
-    拉取某个项目下的所有 sections，返回 {section名: id}
+    从 sync_status 里单条命令的结果中取出错误信息
     """
-    resp = requests.get(
-        f"{TODOIST_BASE_URL}/sections",
-        headers=todoist_headers(),
-        params={"project_id": project_id},
-        timeout=15,
-    )
-    resp.raise_for_status()
-    sections = resp.json()
-    return {s["name"]: s["id"] for s in sections}
+    if isinstance(status, dict):
+        return status.get("error", "unknown error")
+    return "missing sync status"
 
 
-def get_or_create_section(name: str, project_id: str, section_map: Dict[str, str]) -> str:
+def sync_status_not_found(status) -> bool:
     """
-    获取 section ID；如果没有就在指定项目下创建
+    判断 sync_status 里单条命令是否因为对象不存在而失败（如项目 / section 已在 Todoist 里被删除）
     """
-    if name in section_map:
-        return section_map[name]
+    if not isinstance(status, dict):
+        return False
+    return status.get("http_code") == 404 or str(status.get("error_tag", "")).endswith("NOT_FOUND")
 
-    resp = requests.post(
-        f"{TODOIST_BASE_URL}/sections",
-        headers=todoist_headers(),
-        json={"name": name, "project_id": project_id},
-        timeout=15,
-    )
-    resp.raise_for_status()
-    section = resp.json()
-    section_map[section["name"]] = section["id"]
-    return section["id"]
 
+def run_sync_commands(commands: List[Tuple[str, dict]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    把 [(命令类型, args)] 按 SYNC_BATCH_SIZE 切批提交给 Sync API，按传入顺序返回 [(错误信息, 新 id)]：
+    - 成功时错误信息为 None；*_add 命令的新 id 从 temp_id_mapping 取，取不到也算失败
+    - 整批请求失败（或处理结果时出了意外错误）时，这一批的每条都记同一个错误，不影响其他批次
+    有命令因对象不存在而失败时，说明缓存里的 id 已过期，顺便丢弃项目 / 标签 / section 缓存
+    """
+    results: List[Tuple[Optional[str], Optional[str]]] = []
+    stale_cache = False
+    for start in range(0, len(commands), SYNC_BATCH_SIZE):
+        batch = []
+        for command_type, args in commands[start:start + SYNC_BATCH_SIZE]:
+            command = {"type": command_type, "uuid": str(uuid.uuid4()), "args": args}
+            if command_type.endswith("_add"):
+                command["temp_id"] = str(uuid.uuid4())
+            batch.append(command)
 
-def clear_project_tasks(project_id: str):
+        try:
+            result = sync_commands(batch)
+            sync_status = result.get("sync_status", {})
+            temp_id_mapping = result.get("temp_id_mapping", {})
+            batch_results = []
+            for command in batch:
+                status = sync_status.get(command["uuid"])
+                if status != "ok":
+                    # Sync 整体仍返回 200，对象不存在只能从单条命令的错误里判断
+                    stale_cache = stale_cache or sync_status_not_found(status)
+                    batch_results.append((f"Todoist error: {sync_error_message(status)}", None))
+                elif "temp_id" not in command:
+                    batch_results.append((None, None))
+                elif command["temp_id"] in temp_id_mapping:
+                    batch_results.append((None, str(temp_id_mapping[command["temp_id"]])))
+                else:
+                    batch_results.append(("Todoist error: missing temp_id mapping", None))
+        except requests.RequestException as e:
+            batch_results = [(f"Todoist error: {e}", None)] * len(batch)
+        except Exception as e:
+            batch_results = [(f"Unexpected error: {e}", None)] * len(batch)
+        results.extend(batch_results)
+
+    if stale_cache:
+        invalidate_todoist_cache()
+    return results
+
+
+async def gather_in_threads(
+    calls: List[Callable[[], Any]],
+    limit: int = MAX_CONCURRENT_IMPORTS,
+    return_exceptions: bool = False,
+) -> list:
     """
-    清空某项目下的所有未完成任务
+    在线程池里并发执行一组阻塞调用，同一时间最多 limit 个在途，结果按传入顺序返回
+    return_exceptions 的含义同 asyncio.gather
     """
-    resp = requests.get(
-        f"{TODOIST_BASE_URL}/tasks",
-        headers=todoist_headers(),
-        params={"project_id": project_id},
-        timeout=20,
-    )
-    resp.raise_for_status()
-    tasks = resp.json()
+    sem = asyncio.Semaphore(limit)
 
-    for t in tasks:
-        task_id = t["id"]
-        del_resp = requests.delete(
-            f"{TODOIST_BASE_URL}/tasks/{task_id}",
-            headers=todoist_headers(),
-            timeout=15,
-        )
-        # 单个删除失败就跳过，避免全局中断
-        if del_resp.status_code not in (200, 204):
-            continue
+    async def _run(call):
+        async with sem:
+            return await asyncio.to_thread(call)
+
+    return await asyncio.gather(*(_run(call) for call in calls), return_exceptions=return_exceptions)
+
+
+async def clear_project_tasks(project_id: str):
+    """
+    清空某项目下的所有未完成任务：用 Sync API 的 item_delete 批量删除，多个批次并发提交
+    """
+    tasks = await asyncio.to_thread(fetch_tasks_from_todoist, project_id)
+    commands = [("item_delete", {"id": t["id"]}) for t in tasks]
+
+    # 单个删除失败（sync_status 里的 error）就跳过，避免全局中断
+    await gather_in_threads([
+        partial(run_sync_commands, commands[start:start + SYNC_BATCH_SIZE])
+        for start in range(0, len(commands), SYNC_BATCH_SIZE)
+    ])
+
+
+def format_sync_due_date(dt: datetime) -> str:
+    """
+    把 datetime 转成 Sync API due.date 接受的格式：
+    - 带时区的换算成 UTC，写成 YYYY-MM-DDTHH:MM:SSZ
+    - 不带时区的按浮动时间写成 YYYY-MM-DDTHH:MM:SS，由 due.timezone 决定所在时区
+    """
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
 
 
 def build_due(item: ScheduleItem, tz_default: str) -> Optional[dict]:
     """
-    构造 Todoist 的 due 字段：
+    构造 Sync API item_add 的 due 字段：
     - 如果给了 due_string，就直接用（支持 due_lang 指定语言）
-    - 否则如果给了 start_datetime，就用 datetime + timezone
+    - 否则如果给了 start_datetime，就用 date + timezone
     """
     if item.due_string:
         due_obj = {"string": item.due_string}
@@ -425,12 +627,287 @@ def build_due(item: ScheduleItem, tz_default: str) -> Optional[dict]:
 
     if item.start_datetime:
         tz = item.timezone or tz_default
-        iso = item.start_datetime.isoformat()
-        return {"datetime": iso, "timezone": tz}
+        return {"date": format_sync_due_date(item.start_datetime), "timezone": tz}
 
     return None
 
 
+def to_sync_item_args(payload: dict) -> dict:
+    """
+    把任务 payload 转成 Sync API item_add 的 args：
+    - duration + duration_unit -> {"amount": ..., "unit": ...}
+    """
+    args = dict(payload)
+    if "duration" in args:
+        args["duration"] = {
+            "amount": args.pop("duration"),
+            "unit": args.pop("duration_unit", "minute"),
+        }
+    return args
+
+
+def create_task_batch(batch: List[Tuple[int, dict]]) -> Tuple[List[CreatedTask], List[ErrorInfo]]:
+    """
+    用 Sync API 的 item_add 命令创建一批任务（不超过 SYNC_BATCH_SIZE 条，即一次请求），返回 (created, errors)
+    """
+    created: List[CreatedTask] = []
+    errors: List[ErrorInfo] = []
+    outcomes = run_sync_commands([("item_add", to_sync_item_args(payload)) for _, payload in batch])
+    for (idx, payload), (error, task_id) in zip(batch, outcomes):
+        if error:
+            errors.append(ErrorInfo(index=idx, message=error))
+            continue
+        created.append(
+            CreatedTask(
+                index=idx,
+                task_id=task_id,
+                content=payload["content"],
+                project_id=payload.get("project_id"),
+                dry_run=False,
+            )
+        )
+
+    return created, errors
+
+
+async def create_tasks(pending: List[Tuple[int, dict]]) -> Tuple[List[CreatedTask], List[ErrorInfo]]:
+    """
+    批量创建任务，返回 (created, errors)：
+    按 SYNC_BATCH_SIZE 切成若干 Sync 批次并发提交，同时在途的批次不超过 MAX_CONCURRENT_IMPORTS；
+    只有 1 条时也走 Sync（同样是一次请求），保证 due 等字段的处理和多条时一致
+    """
+    results = await gather_in_threads([
+        partial(create_task_batch, pending[start:start + SYNC_BATCH_SIZE])
+        for start in range(0, len(pending), SYNC_BATCH_SIZE)
+    ])
+
+    created: List[CreatedTask] = []
+    errors: List[ErrorInfo] = []
+    for batch_created, batch_errors in results:
+        created.extend(batch_created)
+        errors.extend(batch_errors)
+    return created, errors
+
+
+def create_missing_projects_and_labels(
+    project_names: List[str],
+    label_names: List[str],
+    project_map: Dict[str, str],
+    label_map: Dict[str, str],
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    把缺失的项目 / 标签合成 Sync 批次（project_add / label_add）一次创建，
+    新 id 从 temp_id_mapping 写回 project_map / label_map，同时写回进程内缓存
+    返回 (项目创建失败 {名称: 错误信息}, 标签创建失败 {名称: 错误信息})
+    """
+    project_failures: Dict[str, str] = {}
+    label_failures: Dict[str, str] = {}
+
+    planned = []  # (命令类型, 名称, 要写回的映射, 写回缓存的函数, 失败记录)
+    for command_type, names, name_map, remember, failures in (
+        ("project_add", project_names, project_map, partial(_remember, "projects"), project_failures),
+        ("label_add", label_names, label_map, partial(_remember, "labels"), label_failures),
+    ):
+        for name in names:
+            if name not in name_map:
+                planned.append((command_type, name, name_map, remember, failures))
+
+    outcomes = run_sync_commands([(command_type, {"name": name}) for command_type, name, _, _, _ in planned])
+    for (_, name, name_map, remember, failures), (error, new_id) in zip(planned, outcomes):
+        if error:
+            failures[name] = error
+        else:
+            name_map[name] = new_id
+            remember(name, new_id)
+
+    return project_failures, label_failures
+
+
+def resolve_sections(
+    pairs: List[Tuple[str, str]],
+    new_project_ids: Iterable[str] = (),
+) -> Dict[Tuple[str, str], str]:
+    """
+    批量解析 (project_id, section名) -> section_id：每个项目的 section 映射只拉一次（失败也只试一次），
+    缺失的 section 合成 Sync 批次（section_add）一次创建，不再逐个 POST /sections
+    new_project_ids 是本次导入刚建的项目，肯定还没有 section，不用再去拉
+    拉取 / 创建失败的 section 不会出现在结果里
+    """
+    section_ids: Dict[Tuple[str, str], str] = {}
+    # {project_id: {section名: id}}，None 表示该项目的 section 拉取失败
+    section_map_cache: Dict[str, Optional[Dict[str, str]]] = {pid: {} for pid in new_project_ids}
+    missing: List[Tuple[str, str]] = []
+    for project_id, name in pairs:
+        if project_id not in section_map_cache:
+            try:
+                section_map_cache[project_id] = fetch_sections(project_id)
+            except Exception:
+                # Section 拉取失败（包括响应结构异常）不影响任务创建；只记一次，同项目的其余 section 直接跳过
+                section_map_cache[project_id] = None
+        section_map = section_map_cache[project_id]
+        if section_map is None:
+            continue
+        if name in section_map:
+            section_ids[(project_id, name)] = section_map[name]
+        else:
+            missing.append((project_id, name))
+
+    outcomes = run_sync_commands([
+        ("section_add", {"name": name, "project_id": project_id})
+        for project_id, name in missing
+    ])
+    for (project_id, name), (error, section_id) in zip(missing, outcomes):
+        if not error:
+            section_map_cache[project_id][name] = section_id
+            _remember(section_cache_key(project_id), name, section_id)
+            section_ids[(project_id, name)] = section_id
+    return section_ids
+
+
+def build_task_payloads(
+    items: List[ScheduleItem],
+    options: ImportOptions,
+    project_map: Dict[str, str],
+    label_map: Dict[str, str],
+) -> Tuple[List[Tuple[int, dict]], List[ErrorInfo]]:
+    """
+    把每条 item 转成 Todoist 任务 payload，返回 ([(原始 index, payload)], errors)
+    缺失的项目 / 标签会在循环前去重后用一个 Sync 批次统一创建，section 也在循环前按 (项目, 名称) 去重统一解析，
+    所以这里会访问 Todoist；循环里只做字典查找
+    """
+    pending: List[Tuple[int, dict]] = []
+    errors: List[ErrorInfo] = []
+
+    # 与 item 无关的选项在循环外取一次
+    force_project = (
+        options.replace_project_name
+        if options.mode == ImportMode.REPLACE_PROJECT
+        else None
+    )
+    default_project_name = options.default_project_name
+    default_section_name = options.default_section_name
+    tz_default = options.default_timezone or "Asia/Singapore"
+    prefix = options.title_prefix or ""
+    suffix = options.title_suffix or ""
+    default_prio = options.default_priority or 1
+
+    # 1. 计算每条 item 的最终项目名
+    if force_project:
+        # replace_project 模式下，强制把所有任务打到同一个项目里
+        project_names = [force_project] * len(items)
+    else:
+        project_names = [
+            item.project_name
+            or default_project_name
+            or item.project_name  # 防止都为空，保持旧逻辑
+            for item in items
+        ]
+
+    # 先把用到的项目 / 标签去重后统一解析一次，循环里只做字典查找
+    needed_projects = [name for name in dict.fromkeys(project_names) if name]
+    needed_labels = list(dict.fromkeys(chain(
+        options.default_labels or [],
+        chain.from_iterable(item.labels or [] for item in items),
+    )))
+    missing_projects = [name for name in needed_projects if name not in project_map]
+    project_failures, label_failures = create_missing_projects_and_labels(
+        needed_projects, needed_labels, project_map, label_map
+    )
+    new_project_ids = [project_map[name] for name in missing_projects if name in project_map]
+
+    # Sync API item_add 的 labels 和 REST v2 一样用标签名称，不是 ID；label_map 只用来确认标签已存在
+    default_labels = tuple(dict.fromkeys(options.default_labels or ()))
+    default_label_names = [name for name in default_labels if name in label_map]
+
+    # 所有 item 都相同的字段先放进 payload 模板，循环里只补各自不同的部分
+    base_payload: dict = {}
+    if len(set(project_names)) == 1 and project_names[0] in project_map:
+        base_payload["project_id"] = project_map[project_names[0]]
+    if default_label_names:
+        base_payload["labels"] = default_label_names
+
+    # replace_project 模式下目标项目在调用前就已建好，所有任务共用同一个 project_id
+    forced_project_id = project_map.get(force_project) if force_project else None
+
+    # 1.5. 每条 item 的 project_id / section 名先算好，用到的 section 去重后统一解析
+    item_project_ids = [
+        forced_project_id or (project_map.get(name) if name else None)
+        for name in project_names
+    ]
+    section_names = [item.section_name or default_section_name for item in items]
+    section_ids = resolve_sections(
+        list(dict.fromkeys(
+            (project_id, section_name)
+            for project_id, section_name in zip(item_project_ids, section_names)
+            if project_id and section_name
+        )),
+        new_project_ids,
+    )
+
+    for idx, item in enumerate(items):
+        if not forced_project_id and project_names[idx] in project_failures:
+            errors.append(ErrorInfo(index=idx, message=project_failures[project_names[idx]]))
+            continue
+        project_id = item_project_ids[idx]
+        section_id = section_ids.get((project_id, section_names[idx]))
+
+        # 2. 合并标签：default_labels 在前，item.labels 去重追加
+        #    item 没有自己的标签时直接复用默认标签，省掉去重
+        if item.labels:
+            seen = set(default_labels)
+            all_labels = list(default_labels)
+            for name in item.labels:
+                if name not in seen:
+                    seen.add(name)
+                    all_labels.append(name)
+        else:
+            all_labels = default_labels
+
+        unresolved = [name for name in all_labels if name in label_failures]
+        if unresolved:
+            errors.append(ErrorInfo(index=idx, message=label_failures[unresolved[0]]))
+            continue
+
+        # 3. 时间
+        start_iso = item.start_datetime.isoformat() if item.start_datetime else None
+        end_iso = item.end_datetime.isoformat() if item.end_datetime else None
+        due = build_due(item, tz_default)
+
+        # 4. description，把时间块写进去方便你查看
+        description = item.description or ""
+        if start_iso or end_iso:
+            time_str = f"Time block: {start_iso or ''}{' ~ ' + end_iso if end_iso else ''}"
+            description = f"{description}\n{time_str}" if description else time_str
+
+        # 5. 标题前后缀
+        title = f"{prefix}{item.title}{suffix}"
+
+        # 6. 在模板基础上拼 Todoist 任务 payload
+        payload = {
+            **base_payload,
+            "content": title,
+            "priority": item.priority or default_prio,
+        }
+        if description:
+            payload["description"] = description
+        if project_id and "project_id" not in base_payload:
+            payload["project_id"] = project_id
+        if section_id:
+            payload["section_id"] = section_id
+        if item.labels:
+            # item 自带标签时才覆盖模板里的默认标签
+            payload["labels"] = list(all_labels)
+        if due:
+            payload["due"] = due
+        if item.duration_minutes:
+            payload["duration"] = item.duration_minutes
+            payload["duration_unit"] = "minute"
+
+        pending.append((idx, payload))
+
+    return pending, errors
+
+
 # ---------- 主接口 ----------
 
 @app.get("/")
@@ -446,7 +923,7 @@ def health_check():
 
 
 @app.post("/import_schedule_to_todoist", response_model=ImportResponse)
-def import_schedule(body: ImportRequest):
+async def import_schedule(body: ImportRequest):
     """
     把一组课表 items 批量导入 Todoist，支持：
     - mode=create：只追加
@@ -457,172 +934,63 @@ def import_schedule(body: ImportRequest):
     - section 分组（自动创建 section）
     - duration 时长设置
     - due_lang 自然语言时间解析（支持中文）
-    """
-    headers = todoist_headers()
 
+    Todoist 调用都是阻塞的 requests，统一放进线程池执行，不阻塞事件循环
+    """
     # 如果 options 为空，就使用 ImportOptions 的默认配置
     options = body.options or ImportOptions()
-    created: List[CreatedTask] = []
-    errors: List[ErrorInfo] = []
 
-    # 先获取现有项目和标签映射
+    # 先并发获取现有项目和标签映射
     try:
-        project_map = fetch_projects()
-    except requests.RequestException as e:
-        raise HTTPException(
-            status_code=502,
-            detail=f"Failed to fetch Todoist projects: {e}"
+        project_map, label_map = await asyncio.gather(
+            asyncio.to_thread(fetch_projects),
+            asyncio.to_thread(fetch_labels),
         )
-
-    try:
-        label_map = fetch_labels()
     except requests.RequestException as e:
         raise HTTPException(
             status_code=502,
-            detail=f"Failed to fetch Todoist labels: {e}"
+            detail=f"Failed to fetch Todoist projects and labels: {e}"
         )
 
     # 如果是 replace_project 模式，且指定了 replace_project_name，则先清空项目
     target_project_id_for_replace: Optional[str] = None
     if options.mode == ImportMode.REPLACE_PROJECT and options.replace_project_name:
         try:
-            target_project_id_for_replace = get_or_create_project(
-                options.replace_project_name, project_map
+            target_project_id_for_replace = await asyncio.to_thread(
+                get_or_create_project, options.replace_project_name, project_map
             )
             if not options.dry_run:
-                clear_project_tasks(target_project_id_for_replace)
+                await clear_project_tasks(target_project_id_for_replace)
         except requests.RequestException as e:
             raise HTTPException(
                 status_code=502,
                 detail=f"Failed to prepare project for replace_project mode: {e}"
             )
 
-    for idx, item in enumerate(body.items):
-        try:
-            # 1. 计算最终项目名
-            effective_project_name = (
-                item.project_name
-                or options.default_project_name
-                or item.project_name  # 防止都为空，保持旧逻辑
-            )
-
-            # replace_project 模式下，强制把所有任务打到同一个项目里
-            if options.mode == ImportMode.REPLACE_PROJECT and options.replace_project_name:
-                effective_project_name = options.replace_project_name
-
-            project_id = None
-            if effective_project_name:
-                project_id = get_or_create_project(effective_project_name, project_map)
-
-            # 1.5. 处理 section（需要先有 project_id）
-            section_id = None
-            if project_id:
-                effective_section_name = item.section_name or options.default_section_name
-                if effective_section_name:
-                    # 获取该项目的 section 映射（为避免频繁请求，可优化为按项目缓存）
-                    try:
-                        section_map = fetch_sections(project_id)
-                        section_id = get_or_create_section(
-                            effective_section_name, project_id, section_map
-                        )
-                    except requests.RequestException as e:
-                        # Section 创建失败不影响任务创建，记录但继续
-                        pass
-
-            # 2. 合并标签：item.labels + default_labels 去重
-            all_labels = list(
-                dict.fromkeys((options.default_labels or []) + (item.labels or []))
-            )
-            label_ids: List[str] = []
-            for name in all_labels:
-                label_ids.append(get_or_create_label(name, label_map))
-
-            # 3. 时间
-            tz_default = options.default_timezone or "Asia/Singapore"
-            due = build_due(item, tz_default)
-
-            # 4. description，把时间块写进去方便你查看
-            desc_parts = []
-            if item.description:
-                desc_parts.append(item.description)
-
-            if item.start_datetime or item.end_datetime:
-                time_str = "Time block: "
-                if item.start_datetime:
-                    time_str += item.start_datetime.isoformat()
-                if item.end_datetime:
-                    time_str += " ~ " + item.end_datetime.isoformat()
-                desc_parts.append(time_str)
-
-            description = "\n".join(desc_parts) if desc_parts else ""
-
-            # 5. 标题前后缀
-            title = item.title
-            if options.title_prefix:
-                title = f"{options.title_prefix}{title}"
-            if options.title_suffix:
-                title = f"{title}{options.title_suffix}"
-
-            # 6. 拼 Todoist 任务 payload
-            payload = {
-                "content": title,
-                "priority": item.priority or options.default_priority or 1,
-            }
-            if description:
-                payload["description"] = description
-            if project_id:
-                payload["project_id"] = project_id
-            if section_id:
-                payload["section_id"] = section_id
-            if label_ids:
-                payload["labels"] = label_ids
-            if due:
-                payload["due"] = due
-            if item.duration_minutes:
-                payload["duration"] = item.duration_minutes
-                payload["duration_unit"] = "minute"
-
-            # dry_run：只返回"会创建什么"，不真正写入
-            if options.dry_run:
-                created.append(
-                    CreatedTask(
-                        index=idx,
-                        task_id="dry-run",
-                        content=title,
-                        project_id=project_id,
-                        dry_run=True,
-                    )
-                )
-                continue
+    pending, errors = await asyncio.to_thread(
+        build_task_payloads, body.items, options, project_map, label_map
+    )
 
-            # 7. 创建任务
-            resp = requests.post(
-                f"{TODOIST_BASE_URL}/tasks",
-                headers=headers,
-                json=payload,
-                timeout=20,
-            )
-            resp.raise_for_status()
-            task = resp.json()
-
-            created.append(
-                CreatedTask(
-                    index=idx,
-                    task_id=str(task["id"]),
-                    content=task["content"],
-                    project_id=task.get("project_id"),
-                    dry_run=False,
-                )
+    # dry_run：只返回"会创建什么"，不真正写入
+    if options.dry_run:
+        created = [
+            CreatedTask(
+                index=idx,
+                task_id="dry-run",
+                content=payload["content"],
+                project_id=payload.get("project_id"),
+                dry_run=True,
             )
+            for idx, payload in pending
+        ]
+        return ImportResponse(created=created, errors=errors)
 
-        except requests.RequestException as e:
-            errors.append(
-                ErrorInfo(index=idx, message=f"Todoist error: {e}")
-            )
-        except Exception as e:
-            errors.append(
-                ErrorInfo(index=idx, message=f"Unexpected error: {e}")
-            )
+    # 批量创建任务（Sync API 一次请求提交多条，多个批次并发）
+    created: List[CreatedTask] = []
+    if pending:
+        created, create_errors = await create_tasks(pending)
+        errors.extend(create_errors)
+        errors.sort(key=lambda e: e.index)
 
     return ImportResponse(created=created, errors=errors)
 
@@ -633,19 +1001,17 @@ def fetch_tasks_from_todoist(project_id: Optional[str] = None) -> List[dict]:
     """
     从 Todoist 获取任务列表
     """
-    headers = todoist_headers()
     params = {}
     if project_id:
         params["project_id"] = project_id
     
-    resp = requests.get(
+    resp = get_session().get(
         f"{TODOIST_BASE_URL}/tasks",
-        headers=headers,
         params=params,
         timeout=20,
     )
     resp.raise_for_status()
-    return resp.json()
+    return decode_json(resp)
 
 
 def parse_task_due(due_obj: Optional[dict]) -> tuple:
@@ -659,26 +1025,144 @@ def parse_task_due(due_obj: Optional[dict]) -> tuple:
     raw_string = due_obj.get("string")
     
     # 如果有 datetime 字段（带时间）
-    if "datetime" in due_obj and due_obj["datetime"]:
+    raw_datetime = due_obj.get("datetime")
+    if raw_datetime:
+        # Python 3.11+ 的 fromisoformat 能直接解析结尾的 Z，只有旧版本才需要替换成 +00:00 再试一次
         try:
-            dt = datetime.fromisoformat(due_obj["datetime"].replace("Z", "+00:00"))
-            return dt, None, raw_string
-        except:
-            pass
+            return datetime.fromisoformat(raw_datetime), None, raw_string
+        except ValueError:
+            try:
+                return datetime.fromisoformat(raw_datetime.replace("Z", "+00:00")), None, raw_string
+            except ValueError:
+                pass
     
     # 如果只有 date 字段（只有日期）
-    if "date" in due_obj and due_obj["date"]:
+    raw_date = due_obj.get("date")
+    if raw_date:
         try:
-            d = datetime.strptime(due_obj["date"], "%Y-%m-%d").date()
-            return None, d, raw_string
-        except:
+            return None, date.fromisoformat(raw_date), raw_string
+        except ValueError:
             pass
     
     return None, None, raw_string
 
 
+def parse_task_duration(task: dict) -> Optional[int]:
+    """
+    解析 Todoist 任务的 duration 字段，只认以分钟为单位的时长
+    """
+    duration = task.get("duration")
+    if duration:
+        amount = duration.get("amount")
+        if amount and duration.get("unit") == "minute":
+            return amount
+    return None
+
+
+async def fetch_filtered_tasks(
+    project_names: Optional[List[str]],
+    label_filters: Optional[List[str]],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    include_without_due: bool,
+) -> Tuple[Dict[str, str], Dict[str, str], List[Tuple[dict, Optional[datetime], Optional[date], Optional[str]]]]:
+    """
+    并发拉取项目 / 标签映射，再并发拉取要查询的项目下的任务
+    每个项目的响应在各自的线程里拿到就立刻用 filter_tasks 过滤，只保留通过筛选的任务，
+    不会先把所有项目的原始任务拼成一个大列表
+    返回 (project_map, label_map, [(task, due_datetime, due_date, raw_due_string)])
+    """
+    # 1. 并发获取项目和标签映射
+    project_map, label_map = await asyncio.gather(
+        asyncio.to_thread(fetch_projects),  # {name: id}
+        asyncio.to_thread(fetch_labels),    # {name: id}
+    )
+
+    # 2. 确定要查询的项目
+    project_ids_to_query = []
+    if project_names:
+        for name in project_names:
+            if name in project_map:
+                project_ids_to_query.append(project_map[name])
+    else:
+        # 查询所有项目
+        project_ids_to_query = list(project_map.values()) if project_map else [None]
+
+    def fetch_and_filter(project_id: Optional[str] = None):
+        return filter_tasks(
+            fetch_tasks_from_todoist(project_id),
+            label_map,
+            label_filters,
+            date_from,
+            date_to,
+            include_without_due,
+        )
+
+    # 3. 获取并过滤任务（多个项目并发拉取，在途请求不超过连接池大小）
+    if not project_ids_to_query:
+        # 如果没有指定项目，查所有
+        survivors = await asyncio.to_thread(fetch_and_filter)
+    else:
+        survivor_lists = await gather_in_threads(
+            [partial(fetch_and_filter, pid) for pid in project_ids_to_query],
+            limit=HTTP_POOL_SIZE,
+        )
+        survivors = list(chain.from_iterable(survivor_lists))
+
+    return project_map, label_map, survivors
+
+
+def filter_tasks(
+    tasks: List[dict],
+    label_map: Dict[str, str],
+    label_filters: Optional[List[str]],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    include_without_due: bool,
+) -> List[Tuple[dict, Optional[datetime], Optional[date], Optional[str]]]:
+    """
+    按标签和时间范围过滤原始任务
+    返回通过筛选的 [(task, due_datetime, due_date, raw_due_string)]
+    """
+    # 每个要求的标签预先算好可接受的取值（名称或 ID），逐个任务只做集合判断，
+    # 被筛掉的任务不用再把标签 ID 转成名称
+    required_label_keys = [
+        frozenset((name, label_map[name])) if name in label_map else frozenset((name,))
+        for name in dict.fromkeys(label_filters or ())
+    ]
+
+    survivors = []
+    for task in tasks:
+        # 标签过滤
+        if required_label_keys:
+            task_labels = set(task.get("labels", ()))
+            if not all(not keys.isdisjoint(task_labels) for keys in required_label_keys):
+                continue
+
+        # 解析 due
+        due_datetime, due_date, raw_due_string = parse_task_due(task.get("due"))
+
+        # 时间范围过滤
+        if date_from or date_to:
+            task_time = due_datetime or (datetime.combine(due_date, datetime.min.time()) if due_date else None)
+
+            if not task_time:
+                if not include_without_due:
+                    continue
+            else:
+                if date_from and task_time < date_from:
+                    continue
+                if date_to and task_time > date_to:
+                    continue
+        elif not (due_datetime or due_date) and not include_without_due:
+            continue
+
+        survivors.append((task, due_datetime, due_date, raw_due_string))
+    return survivors
+
+
 @app.post("/query_tasks", response_model=TasksQueryResponse)
-def query_tasks(query: TasksQuery):
+async def query_tasks(query: TasksQuery):
     """
     查询 Todoist 任务列表，支持：
     - 按项目名筛选
@@ -687,74 +1171,56 @@ def query_tasks(query: TasksQuery):
     - 限制返回数量
     """
     try:
-        # 1. 获取项目和标签映射
-        project_map = fetch_projects()  # {name: id}
-        label_map = fetch_labels()      # {name: id}
+        # 1~3. 获取项目 / 标签映射，拉取任务时就地过滤，只留下通过筛选的任务
+        project_map, label_map, survivors = await fetch_filtered_tasks(
+            query.project_names,
+            query.label_filters,
+            query.date_from,
+            query.date_to,
+            query.include_without_due,
+        )
         
-        # 创建反向映射
-        project_id_to_name = {v: k for k, v in project_map.items()}
-        label_id_to_name = {v: k for k, v in label_map.items()}
+        # 4. 按廉价的排序键取前 limit 个，再构造 TaskSummary
+        # 排序键用 (bucket, 时间戳) 这样的纯数字元组，不在比较时临时构造 datetime
+        def sort_key(entry):
+            _, due_datetime, due_date, _ = entry
+            if due_datetime:
+                return (0, due_datetime.timestamp())
+            elif due_date:
+                return (1, time.mktime(due_date.timetuple()))
+            else:
+                return (2, float("inf"))
         
-        # 2. 确定要查询的项目
-        project_ids_to_query = []
-        if query.project_names:
-            for name in query.project_names:
-                if name in project_map:
-                    project_ids_to_query.append(project_map[name])
-        else:
-            # 查询所有项目
-            project_ids_to_query = list(project_map.values()) if project_map else [None]
+        # limit 远小于任务数时，nsmallest 比整体排序更省
+        selected = heapq.nsmallest(query.limit, survivors, key=sort_key)
         
-        # 3. 获取所有任务
-        all_tasks = []
-        if not project_ids_to_query:
-            # 如果没有指定项目，查所有
-            all_tasks = fetch_tasks_from_todoist()
-        else:
-            for pid in project_ids_to_query:
-                tasks = fetch_tasks_from_todoist(pid)
-                all_tasks.extend(tasks)
+        # 反向映射只保留最终返回的任务里用到的 ID，不整体反转全部项目 / 标签
+        used_project_ids = {task.get("project_id") for task, _, _, _ in selected}
+        used_label_ids = set(chain.from_iterable(task.get("labels", ()) for task, _, _, _ in selected))
+        project_id_to_name = {v: k for k, v in project_map.items() if v in used_project_ids}
+        label_id_to_name = {v: k for k, v in label_map.items() if v in used_label_ids}
         
-        # 4. 获取所有相关项目的 section 映射
+        # 5. 只为最终返回、且带 section 的任务并发获取 section 映射
+        section_pids = list(dict.fromkeys(
+            task["project_id"] for task, _, _, _ in selected
+            if task.get("project_id") and task.get("section_id")
+        ))
+        section_results = await gather_in_threads(
+            [partial(fetch_sections, pid) for pid in section_pids],
+            limit=HTTP_POOL_SIZE,
+            return_exceptions=True,
+        )
         section_cache = {}  # {project_id: {section_id: section_name}}
-        for task in all_tasks:
-            pid = task.get("project_id")
-            if pid and pid not in section_cache:
-                try:
-                    sections = fetch_sections(pid)  # {name: id}
-                    section_cache[pid] = {v: k for k, v in sections.items()}  # {id: name}
-                except:
-                    section_cache[pid] = {}
+        for pid, sections in zip(section_pids, section_results):
+            if isinstance(sections, Exception):
+                section_cache[pid] = {}
+            else:
+                section_cache[pid] = {v: k for k, v in sections.items()}  # {id: name}
         
-        # 5. 过滤和转换任务
         results = []
-        for task in all_tasks:
-            # 解析标签
-            task_label_ids = task.get("labels", [])
-            task_label_names = [label_id_to_name.get(lid, lid) for lid in task_label_ids]
-            
-            # 标签过滤
-            if query.label_filters:
-                if not all(label in task_label_names for label in query.label_filters):
-                    continue
-            
-            # 解析 due
-            due_datetime, due_date, raw_due_string = parse_task_due(task.get("due"))
-            
-            # 时间范围过滤
-            if query.date_from or query.date_to:
-                task_time = due_datetime or (datetime.combine(due_date, datetime.min.time()) if due_date else None)
-                
-                if not task_time:
-                    if not query.include_without_due:
-                        continue
-                else:
-                    if query.date_from and task_time < query.date_from:
-                        continue
-                    if query.date_to and task_time > query.date_to:
-                        continue
-            elif not (due_datetime or due_date) and not query.include_without_due:
-                continue
+        for task, due_datetime, due_date, raw_due_string in selected:
+            # 只给通过筛选的任务解析标签名称
+            task_label_names = [label_id_to_name.get(lid, lid) for lid in task.get("labels", ())]
             
             # 获取 section 名称
             section_id = task.get("section_id")
@@ -765,12 +1231,7 @@ def query_tasks(query: TasksQuery):
                     section_name = section_cache[pid].get(section_id)
             
             # 解析 duration
-            duration_minutes = None
-            if task.get("duration"):
-                amount = task["duration"].get("amount")
-                unit = task["duration"].get("unit")
-                if amount and unit == "minute":
-                    duration_minutes = amount
+            duration_minutes = parse_task_duration(task)
             
             # 构造 TaskSummary
             summary = TaskSummary(
@@ -790,21 +1251,6 @@ def query_tasks(query: TasksQuery):
                 is_completed=task.get("is_completed", False)
             )
             results.append(summary)
-            
-            # 限制数量
-            if len(results) >= query.limit:
-                break
-        
-        # 6. 按时间排序
-        def sort_key(t: TaskSummary):
-            if t.due_datetime:
-                return (0, t.due_datetime)
-            elif t.due_date:
-                return (1, datetime.combine(t.due_date, datetime.min.time()))
-            else:
-                return (2, datetime.max)
-        
-        results.sort(key=sort_key)
         
         return TasksQueryResponse(tasks=results)
     
@@ -822,8 +1268,37 @@ def query_tasks(query: TasksQuery):
 
 # ---------- 空档计算接口 ----------
 
+async def fetch_busy_intervals(
+    project_names: Optional[List[str]],
+    label_filters: Optional[List[str]],
+    date_from: datetime,
+    date_to: datetime,
+) -> List[Tuple[datetime, datetime]]:
+    """
+    拉取占用时间的任务，直接转成 (开始, 结束) 忙碌区间；没有 duration 的任务默认按 1 小时计
+    空档计算用不到 section 和 TaskSummary，所以不走 query_tasks，省掉 section 请求和模型构造
+    """
+    # 空档计算只看有时间的任务
+    _, _, survivors = await fetch_filtered_tasks(
+        project_names, label_filters, date_from, date_to, include_without_due=False
+    )
+
+    intervals: List[Tuple[datetime, datetime]] = []
+    for task, due_datetime, _, _ in survivors:
+        if not due_datetime:
+            continue  # 只处理有具体时间的任务
+
+        duration_minutes = parse_task_duration(task)
+        if duration_minutes:
+            end = due_datetime + timedelta(minutes=duration_minutes)
+        else:
+            end = due_datetime + timedelta(hours=1)
+        intervals.append((due_datetime, end))
+    return intervals
+
+
 @app.post("/free_slots", response_model=FreeSlotResponse)
-def compute_free_slots(request: FreeSlotRequest):
+async def compute_free_slots(request: FreeSlotRequest):
     """
     计算指定时间范围内的空档时间，支持：
     - 按项目和标签筛选"占用时间"的任务
@@ -831,38 +1306,28 @@ def compute_free_slots(request: FreeSlotRequest):
     - 过滤最小空档时长
     """
     try:
-        # 1. 先用内部的 query_tasks 获取所有占用时间的任务
-        query = TasksQuery(
-            project_names=request.project_names,
-            label_filters=request.label_filters,
-            date_from=request.date_from,
-            date_to=request.date_to,
-            include_without_due=False,  # 空档计算只看有时间的任务
-            timezone=request.timezone,
-            limit=1000
+        # 1~2. 获取忙碌时间段，整理成按开始时间排序的堆
+        busy_heap = await fetch_busy_intervals(
+            request.project_names,
+            request.label_filters,
+            request.date_from,
+            request.date_to,
         )
+        heapq.heapify(busy_heap)
         
-        tasks_response = query_tasks(query)
-        
-        # 2. 把任务转换成忙碌时间段
-        busy_intervals = []
-        for task in tasks_response.tasks:
-            if not task.due_datetime:
-                continue  # 只处理有具体时间的任务
-            
-            start = task.due_datetime
-            
-            # 计算结束时间
-            if task.duration_minutes:
-                end = start + timedelta(minutes=task.duration_minutes)
+        # 3. 按开始时间顺序出堆，在整个时间范围上一次性合并重叠区间
+        #    合并后的区间互不重叠，开始 / 结束时间都单调递增，按天取区间时可以直接二分
+        merged: List[Tuple[datetime, datetime]] = []
+        while busy_heap:
+            start, end = heapq.heappop(busy_heap)
+            if merged and start <= merged[-1][1]:
+                # 重叠，合并
+                last_start, last_end = merged[-1]
+                merged[-1] = (last_start, max(last_end, end))
             else:
-                # 默认假设 1 小时
-                end = start + timedelta(hours=1)
-            
-            busy_intervals.append((start, end))
-        
-        # 3. 按开始时间排序
-        busy_intervals.sort(key=lambda x: x[0])
+                merged.append((start, end))
+        merged_starts = [start for start, _ in merged]
+        merged_ends = [end for _, end in merged]
         
         # 4. 解析工作时间
         try:
@@ -874,6 +1339,11 @@ def compute_free_slots(request: FreeSlotRequest):
                 detail="Invalid workday_start or workday_end format. Use 'HH:MM'"
             )
         
+        # 与日期无关的量在循环外算一次：工作时间的起止时刻、最小空档时长
+        work_start_time = datetime.min.time().replace(hour=work_start_hour, minute=work_start_min)
+        work_end_time = datetime.min.time().replace(hour=work_end_hour, minute=work_end_min)
+        min_slot = timedelta(minutes=request.min_slot_minutes)
+        
         # 5. 按天扫描空档
         free_slots = []
         current_date = request.date_from.date()
@@ -881,49 +1351,29 @@ def compute_free_slots(request: FreeSlotRequest):
         
         while current_date <= end_date:
             # 当天的工作时间范围
-            day_start = datetime.combine(
-                current_date,
-                datetime.min.time().replace(hour=work_start_hour, minute=work_start_min)
-            )
-            day_end = datetime.combine(
-                current_date,
-                datetime.min.time().replace(hour=work_end_hour, minute=work_end_min)
-            )
+            day_start = datetime.combine(current_date, work_start_time)
+            day_end = datetime.combine(current_date, work_end_time)
             
-            # 筛选当天的忙碌区间
+            # 二分出和当天工作时间有交集的忙碌区间（跨午夜的区间也会落到第二天），再裁剪到工作时间
+            lo = bisect.bisect_right(merged_ends, day_start)
+            hi = bisect.bisect_left(merged_starts, day_end)
             day_busy = [
                 (max(start, day_start), min(end, day_end))
-                for start, end in busy_intervals
-                if start.date() == current_date and end > day_start and start < day_end
+                for start, end in merged[lo:hi]
             ]
             
-            # 合并重叠的忙碌区间
-            if day_busy:
-                day_busy.sort(key=lambda x: x[0])
-                merged = [day_busy[0]]
-                for start, end in day_busy[1:]:
-                    last_start, last_end = merged[-1]
-                    if start <= last_end:
-                        # 重叠，合并
-                        merged[-1] = (last_start, max(last_end, end))
-                    else:
-                        merged.append((start, end))
-                day_busy = merged
-            
             # 计算空档
             current_time = day_start
             for busy_start, busy_end in day_busy:
                 if current_time < busy_start:
                     # 有空档
-                    gap_minutes = (busy_start - current_time).total_seconds() / 60
-                    if gap_minutes >= request.min_slot_minutes:
+                    if busy_start - current_time >= min_slot:
                         free_slots.append(FreeSlot(start=current_time, end=busy_start))
                 current_time = max(current_time, busy_end)
             
             # 最后一个忙碌区间后到工作日结束
             if current_time < day_end:
-                gap_minutes = (day_end - current_time).total_seconds() / 60
-                if gap_minutes >= request.min_slot_minutes:
+                if day_end - current_time >= min_slot:
                     free_slots.append(FreeSlot(start=current_time, end=day_end))
             
             current_date += timedelta(days=1)
@@ -932,6 +1382,11 @@ def compute_free_slots(request: FreeSlotRequest):
     
     except HTTPException:
         raise
+    except requests.RequestException as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to query Todoist tasks: {e}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,